@@ -0,0 +1,327 @@
+import hashlib
+import os
+import tempfile
+import duckdb
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+import pyarrow as pa
+import streamlit as st
+
+# Shared data loading, KPI and chart helpers for the dashboard pages.
+# Streamlit re-executes the page script on every interaction, but imported modules stay loaded.
+
+##################################### // Load Data // ########################################
+all_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# Parsed workbooks are cached as Parquet in .cache/ under the working directory (/app/.cache in
+# the Docker image). Only the CACHE_MAX_ENTRIES most recently used workbooks are kept, older
+# ones are deleted after each write; remove the directory to clear the cache entirely.
+CACHE_DIR = ".cache"
+CACHE_MAX_ENTRIES = 20
+
+def file_digest(uploaded_file):
+    """SHA-1 of the uploaded bytes, used as the on-disk cache key"""
+    return hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+def read_workbook(uploaded_file):
+    """Parse the workbook, preferring the calamine engine"""
+    try:
+        # calamine (Rust) parses workbooks much faster than the default openpyxl engine
+        return pd.read_excel(uploaded_file, engine="calamine")
+    except ImportError:
+        uploaded_file.seek(0)
+        return pd.read_excel(uploaded_file)
+
+def write_parquet_cache(df, parquet_path):
+    """Write the parsed frame to the disk cache; any failure just leaves the workbook uncached"""
+    # Arrow stores column names as strings, a header such as 2025 would come back as '2025'
+    if not all(isinstance(column, str) for column in df.columns):
+        return
+    tmp_path = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a temp file and rename, so concurrent sessions never read a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".parquet.tmp")
+        os.close(fd)
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, parquet_path)
+        tmp_path = None
+        evict_parquet_cache()
+    except (pa.ArrowException, OSError, ValueError):
+        # e.g. a notes column mixing numbers and text, a read-only or full disk
+        pass
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def evict_parquet_cache():
+    """Delete all but the CACHE_MAX_ENTRIES most recently used cache files"""
+    paths = [
+        os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith(".parquet")
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[CACHE_MAX_ENTRIES:]:
+        os.remove(path)
+
+def read_parquet_cache(parquet_path):
+    """Frame stored for this workbook by an earlier session, or None"""
+    if not os.path.exists(parquet_path):
+        return None
+    try:
+        df = pd.read_parquet(parquet_path)
+        # Mark as recently used for eviction
+        os.utime(parquet_path)
+        return df
+    except (pa.ArrowException, OSError, ValueError):
+        return None
+
+@st.cache_data(show_spinner=False, persist="disk")
+def load_data(uploaded_file):
+    # A workbook that was parsed before is read back from Parquet instead of Excel
+    parquet_path = os.path.join(CACHE_DIR, f"{file_digest(uploaded_file)}.parquet")
+    df = read_parquet_cache(parquet_path)
+    if df is None:
+        df = read_workbook(uploaded_file)
+        write_parquet_cache(df, parquet_path)
+
+    # Low-cardinality labels: comparisons, isin and groupby run on integer codes
+    for column in ('Account', 'business_unit'):
+        df[column] = df[column].astype('category')
+
+    # Yearly total per row as one fused expression (numexpr when installed), empty months count as 0
+    df['_row_total'] = pd.eval(
+        " + ".join(all_months),
+        local_dict={month: df[month].fillna(0) for month in all_months},
+    )
+    return df
+
+@st.cache_resource(show_spinner=False)
+def index_by_filters(digest, _df):
+    """Index the frame on the sidebar filter columns so selections become .loc lookups.
+
+    Kept as a shared resource keyed by the upload's digest: the frame is neither hashed
+    nor copied on reruns, so callers must not modify the returned frame in place.
+    """
+    return _df.set_index(['business_unit', 'Year'], drop=False).sort_index()
+
+def select_rows(df_idx, business_unit, year):
+    """Rows of the indexed frame for the sidebar selection ('All' means no filter)"""
+    bu_key = slice(None) if business_unit == 'All' else [business_unit]
+    year_key = slice(None) if year == 'All' else [year]
+    try:
+        selected = df_idx.loc[(bu_key, year_key), :]
+    except KeyError:
+        # The business unit has no rows for that year
+        selected = df_idx.iloc[:0]
+    # The index levels duplicate the business_unit/Year columns, drop them so groupby stays unambiguous
+    return selected.reset_index(drop=True)
+
+##################################### // Helper Functions // ########################################
+def account_totals(df):
+    """Total per account across all months, one weighted bincount over the precomputed row totals"""
+    codes, accounts = pd.factorize(df['Account'].to_numpy(), use_na_sentinel=False)
+    totals = np.bincount(codes, weights=df['_row_total'].to_numpy(), minlength=len(accounts))
+    return dict(zip(accounts, totals))
+
+def get_connection(df, digest):
+    """Session-scoped DuckDB connection with the loaded frame registered as the `sales` view"""
+    if 'con' not in st.session_state:
+        st.session_state.con = duckdb.connect()
+    # Re-register only when a different workbook was uploaded
+    if st.session_state.get('con_digest') != digest:
+        st.session_state.con.register('sales', df)
+        st.session_state.con_digest = digest
+    return st.session_state.con
+
+def selection_filter(business_unit, year):
+    """WHERE clause and parameters for the sidebar selection ('All' means no filter)"""
+    clauses, params = [], []
+    if business_unit != 'All':
+        clauses.append("business_unit = ?")
+        params.append(business_unit)
+    if year != 'All':
+        clauses.append("Year = ?")
+        params.append(year)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def query_account_totals(con, business_unit='All', year='All'):
+    """Total per account for the selection, aggregated in DuckDB"""
+    where, params = selection_filter(business_unit, year)
+    rows = con.execute(
+        f"SELECT Account, SUM(_row_total) FROM sales {where} GROUP BY Account", params
+    ).fetchall()
+    return dict(rows)
+
+def calculate_kpis(con, business_unit='All', year='All'):
+    """Calculate key performance indicators"""
+    return kpis_from_account_totals(query_account_totals(con, business_unit, year))
+
+def kpis_from_account_totals(account_totals):
+    """Calculate key performance indicators from a mapping of account -> total"""
+    total_sales = account_totals.get('Sales', 0)
+    total_cogs = abs(account_totals.get('Cost of Goods Sold', 0))
+    total_expenses = abs(sum(
+        total for account, total in account_totals.items()
+        if account not in ('Sales', 'Cost of Goods Sold')
+    ))
+    return summarize_kpis(total_sales, total_cogs, total_expenses)
+
+def summarize_kpis(total_sales, total_cogs, total_expenses):
+    """Derive profit and margin figures from the three base totals"""
+    gross_profit = total_sales - total_cogs
+    net_profit = gross_profit - total_expenses
+    
+    gross_margin = (gross_profit / total_sales * 100) if total_sales != 0 else 0
+    net_margin = (net_profit / total_sales * 100) if total_sales != 0 else 0
+    
+    return {
+        'total_sales': total_sales,
+        'total_cogs': total_cogs,
+        'total_expenses': total_expenses,
+        'gross_profit': gross_profit,
+        'net_profit': net_profit,
+        'gross_margin': gross_margin,
+        'net_margin': net_margin
+    }
+
+def query_bu_comparison(con, business_unit='All', year='All'):
+    """Revenue, expenses, net profit and net margin per business unit for the selection, in one DuckDB query"""
+    where, params = selection_filter(business_unit, year)
+    return con.execute(
+        f"""
+        WITH totals AS (
+            SELECT
+                CAST(business_unit AS VARCHAR) AS bu,
+                COALESCE(SUM(_row_total) FILTER (WHERE Account = 'Sales'), 0) AS revenue,
+                ABS(COALESCE(SUM(_row_total) FILTER (WHERE Account = 'Cost of Goods Sold'), 0)) AS cogs,
+                ABS(COALESCE(SUM(_row_total) FILTER (
+                    WHERE Account IS NULL OR Account NOT IN ('Sales', 'Cost of Goods Sold')
+                ), 0)) AS expenses
+            FROM sales {where}
+            GROUP BY business_unit
+        )
+        SELECT
+            bu AS "Business Unit",
+            revenue AS "Revenue",
+            expenses AS "Expenses",
+            revenue - cogs - expenses AS "Net Profit",
+            CASE WHEN revenue <> 0 THEN (revenue - cogs - expenses) / revenue * 100 ELSE 0 END AS "Net Margin (%)"
+        FROM totals
+        ORDER BY bu
+        """,
+        params,
+    ).df()
+
+@st.cache_resource(show_spinner=False)
+def build_sales_long(digest, _df):
+    """Sales rows in long format (one row per business unit, year and month), built once per upload.
+
+    Shared resource keyed by the upload's digest, callers must not modify it in place.
+    """
+    out = _df[_df['Account'] == 'Sales'].melt(
+        id_vars=['business_unit', 'Year'],
+        value_vars=all_months,
+        var_name='Month',
+        value_name='Revenue'
+    )
+    out['Month'] = pd.Categorical(out['Month'], categories=all_months, ordered=True)
+    return out
+
+# Decorative background series for the metric cards, drawn once and shared by every card
+_RNG = np.random.default_rng(0)
+_SPARK = _RNG.integers(0, 101, 30)
+
+# Layout shared by every metric card, only the traces differ between cards
+_METRIC_LAYOUT = dict(
+    margin=dict(t=50, b=0),
+    showlegend=False,
+    #plot_bgcolor="white",
+    plot_bgcolor="rgba(0,0,0,0)",   # Transparent plot background
+    paper_bgcolor="rgba(0,0,0,0)",  # Transparent paper background
+    height=120,
+    xaxis=dict(visible=False, fixedrange=True),
+    yaxis=dict(visible=False, fixedrange=True),
+)
+
+def plot_metric(label, value, prefix="", suffix="", show_graph=False, color_graph="", delta=None):
+    """Enhanced metric display with optional delta"""
+    data = [
+        dict(
+            type="indicator",
+            value=value,
+            gauge={"axis": {"visible": False}},
+            number={
+                "prefix": prefix,
+                "suffix": suffix,
+                "font": {"size": 28},
+            },
+            title={
+                "text": label,
+                "font": {"size": 20},
+            },
+        )
+    ]
+
+    if show_graph:
+        data.append(
+            dict(
+                type="scattergl",
+                y=_SPARK,
+                hoverinfo="skip",
+                fill="tozeroy",
+                fillcolor=color_graph,
+                line={"color": color_graph},
+            )
+        )
+
+    # Building from a single spec validates once instead of per add_trace/update_* call
+    fig = go.Figure(dict(data=data, layout=_METRIC_LAYOUT))
+
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Add delta information below if provided
+    if delta:
+        if delta > 0:
+            st.markdown(f"<p style='text-align: center; color: green;'>📈 +{delta:.1f}%</p>", unsafe_allow_html=True)
+        elif delta < 0:
+            st.markdown(f"<p style='text-align: center; color: red;'>📉 {delta:.1f}%</p>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<p style='text-align: center; color: gray;'>➡️ {delta:.1f}%</p>", unsafe_allow_html=True)
+
+
+def plot_gauge(indicator_number, indicator_color, indicator_suffix, indicator_title, max_bound):
+    """Enhanced gauge chart"""
+    fig = go.Figure(
+        go.Indicator(
+            value=indicator_number,
+            mode="gauge+number+delta",
+            domain={"x": [0, 1], "y": [0, 1]},
+            number={
+                "suffix": indicator_suffix,
+                "font.size": 24,
+            },
+            gauge={
+                "axis": {"range": [0, max_bound], "tickwidth": 1},
+                "bar": {"color": indicator_color},
+                "steps": [
+                    {"range": [0, max_bound*0.5], "color": "lightgray"},
+                    {"range": [max_bound*0.5, max_bound*0.8], "color": "gray"}
+                ],
+                "threshold": {
+                    "line": {"color": "red", "width": 4},
+                    "thickness": 0.75,
+                    "value": max_bound*0.9
+                }
+            },
+            title={
+                "text": indicator_title,
+                "font": {"size": 20},
+            },
+        )
+    )
+    fig.update_layout(
+        height=200,
+        margin=dict(l=10, r=10, t=40, b=10, pad=8),
+    )
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,12 +1,25 @@
 import streamlit as st
-import random       
-import duckdb       
 import pandas as pd 
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
+from common import (
+    all_months,
+    file_digest,
+    load_data,
+    get_connection,
+    index_by_filters,
+    select_rows,
+    account_totals,
+    calculate_kpis,
+    query_bu_comparison,
+    build_sales_long,
+    plot_metric,
+    plot_gauge,
+)
+
 st.set_page_config(page_title="ST Sales Dashboard", page_icon=":bar_chart:", layout="wide")
 
 st.title("🏢 ST Sales Dashboard")
@@ -22,13 +35,10 @@ if uploaded_excel_file is None:
     st.stop()
 
 ##################################### // Load Data // ########################################
-@st.cache_data
-def load_data(uploaded_file):
-    df = pd.read_excel(uploaded_file)
-    return df
-
+digest = file_digest(uploaded_excel_file)
 df = load_data(uploaded_excel_file)
-all_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+df_idx = index_by_filters(digest, df)
+con = get_connection(df, digest)
 
 # Add sidebar filters
 st.sidebar.header("Filters")
@@ -42,144 +52,16 @@ account_types = ['All', 'Sales', 'Expenses']
 selected_account_type = st.sidebar.selectbox("Account Type", account_types)
 
 # Filter data based on selections
-filtered_df = df.copy()
-if selected_business_unit != 'All':
-    filtered_df = filtered_df[filtered_df['business_unit'] == selected_business_unit]
-if selected_year != 'All':
-    filtered_df = filtered_df[filtered_df['Year'] == selected_year]
+filtered_df = select_rows(df_idx, selected_business_unit, selected_year)
 
 with st.expander("View Raw Data", expanded=False):
     st.dataframe(filtered_df, 
-                 column_config={"Year": st.column_config.NumberColumn(format="%d")})
-
-##################################### // Helper Functions // ########################################
-def calculate_total_for_account(df, account_name):
-    """Calculate total for a specific account across all months"""
-    account_df = df[df['Account'] == account_name]
-    if account_df.empty:
-        return 0
-    total = account_df[all_months].sum().sum()
-    return total
-
-def calculate_kpis(df):
-    """Calculate key performance indicators"""
-    total_sales = calculate_total_for_account(df, 'Sales')
-    total_cogs = abs(calculate_total_for_account(df, 'Cost of Goods Sold'))
-    
-    # Calculate total expenses (all non-sales, non-COGS accounts)
-    expense_accounts = df[~df['Account'].isin(['Sales', 'Cost of Goods Sold'])]
-    total_expenses = abs(expense_accounts[all_months].sum().sum())
-    
-    gross_profit = total_sales - total_cogs
-    net_profit = gross_profit - total_expenses
-    
-    gross_margin = (gross_profit / total_sales * 100) if total_sales != 0 else 0
-    net_margin = (net_profit / total_sales * 100) if total_sales != 0 else 0
-    
-    return {
-        'total_sales': total_sales,
-        'total_cogs': total_cogs,
-        'total_expenses': total_expenses,
-        'gross_profit': gross_profit,
-        'net_profit': net_profit,
-        'gross_margin': gross_margin,
-        'net_margin': net_margin
-    }
-
-def plot_metric(label, value, prefix="", suffix="", show_graph=False, color_graph="", delta=None):
-    """Enhanced metric display with optional delta"""
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Indicator(
-            value=value,
-            gauge={"axis": {"visible": False}},
-            number={
-                "prefix": prefix,
-                "suffix": suffix,
-                "font.size": 28,
-            },
-            title={
-                "text": label,
-                "font": {"size": 20},
-            },
-        )
-    )
-
-    if show_graph:
-        fig.add_trace(
-            go.Scatter(
-                y=random.sample(range(0, 101), 30),
-                hoverinfo="skip",
-                fill="tozeroy",
-                fillcolor=color_graph,
-                line={"color": color_graph},
-            )
-        )
-
-    fig.update_xaxes(visible=False, fixedrange=True)
-    fig.update_yaxes(visible=False, fixedrange=True)
-    fig.update_layout(
-        margin=dict(t=50, b=0),
-        showlegend=False,
-        #plot_bgcolor="white",
-        plot_bgcolor="rgba(0,0,0,0)",   # Transparent plot background
-        paper_bgcolor="rgba(0,0,0,0)",  # Transparent paper background
-        height=120,
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Add delta information below if provided
-    if delta:
-        if delta > 0:
-            st.markdown(f"<p style='text-align: center; color: green;'>📈 +{delta:.1f}%</p>", unsafe_allow_html=True)
-        elif delta < 0:
-            st.markdown(f"<p style='text-align: center; color: red;'>📉 {delta:.1f}%</p>", unsafe_allow_html=True)
-        else:
-            st.markdown(f"<p style='text-align: center; color: gray;'>➡️ {delta:.1f}%</p>", unsafe_allow_html=True)
-
-
-def plot_gauge(indicator_number, indicator_color, indicator_suffix, indicator_title, max_bound):
-    """Enhanced gauge chart"""
-    fig = go.Figure(
-        go.Indicator(
-            value=indicator_number,
-            mode="gauge+number+delta",
-            domain={"x": [0, 1], "y": [0, 1]},
-            number={
-                "suffix": indicator_suffix,
-                "font.size": 24,
-            },
-            gauge={
-                "axis": {"range": [0, max_bound], "tickwidth": 1},
-                "bar": {"color": indicator_color},
-                "steps": [
-                    {"range": [0, max_bound*0.5], "color": "lightgray"},
-                    {"range": [max_bound*0.5, max_bound*0.8], "color": "gray"}
-                ],
-                "threshold": {
-                    "line": {"color": "red", "width": 4},
-                    "thickness": 0.75,
-                    "value": max_bound*0.9
-                }
-            },
-            title={
-                "text": indicator_title,
-                "font": {"size": 20},
-            },
-        )
-    )
-    fig.update_layout(
-        height=200,
-        margin=dict(l=10, r=10, t=40, b=10, pad=8),
-    )
-    st.plotly_chart(fig, use_container_width=True)
+                 column_config={"Year": st.column_config.NumberColumn(format="%d"), "_row_total": None})
 
 ##################################### // Executive Summary Cards // ########################################
 st.header("📊 Executive Summary")
 
-kpis = calculate_kpis(filtered_df)
+kpis = calculate_kpis(con, selected_business_unit, selected_year)
 
 col1, col2, col3, col4, col5 = st.columns(5)
 
@@ -246,18 +128,23 @@ st.subheader("🏢 Business Unit Performance")
 bu_cols = st.columns([0.7, 0.7, 0.7])
 
 
-business_unit_names = filtered_df['business_unit'].unique()
 colors = ["#0068C9", "#FF8700", "#FF2B2B", "#29B09D", "#6B46C1"]
 
-for i, bu in enumerate(business_unit_names[:3]):  # Show top 3 business units
-    bu_data = filtered_df[filtered_df['business_unit'] == bu] # filter means that we only get the data for the current business unit
-    
-    bu_sales = calculate_total_for_account(bu_data, 'Sales')
-    
-    bu_expenses = abs(bu_data[~bu_data['Account'].isin(['Sales'])][all_months].sum().sum())
-    
-    efficiency = (bu_sales - bu_expenses) / bu_sales * 100 if bu_sales != 0 else 0
-    
+# Sales vs everything else per business unit, in one groupby over the precomputed row totals.
+# Units come back in category (alphabetical) order, so the gauges show the first three alphabetically
+is_sales = filtered_df['Account'].eq('Sales').rename('is_sales')
+bu_performance = (
+    filtered_df.groupby(['business_unit', is_sales], observed=True)['_row_total'].sum()
+    .unstack(fill_value=0)
+    .reindex(columns=[True, False], fill_value=0)
+)
+bu_performance.columns = ['sales', 'expenses']
+bu_performance['expenses'] = bu_performance['expenses'].abs()
+bu_performance['efficiency'] = (
+    (bu_performance['sales'] - bu_performance['expenses']) / bu_performance['sales'] * 100
+).where(bu_performance['sales'] != 0, 0)
+
+for i, (bu, bu_sales, bu_expenses, efficiency) in enumerate(bu_performance.head(3).itertuples()):  # Show the first 3 business units
     with bu_cols[i]:
         plot_gauge(
             efficiency,
@@ -285,15 +172,12 @@ col1, col2 = st.columns([0.7, 0.3])
 
 with col1:
     st.subheader(" Monthly Revenue Trends")
-    # Melt the data for monthly trends
-    sales_df = filtered_df[filtered_df['Account'] == 'Sales']
-    melted_sales = sales_df.melt(
-        id_vars=['business_unit', 'Year'],
-        value_vars=all_months,
-        var_name='Month',
-        value_name='Revenue'
-    )
-    melted_sales['Month'] = pd.Categorical(melted_sales['Month'], categories=all_months, ordered=True)
+    # Slice the pre-melted sales rows with the sidebar filters
+    melted_sales = build_sales_long(digest, df)
+    if selected_business_unit != 'All':
+        melted_sales = melted_sales[melted_sales['business_unit'] == selected_business_unit]
+    if selected_year != 'All':
+        melted_sales = melted_sales[melted_sales['Year'] == selected_year]
     
     fig_line = px.line(
         melted_sales,
@@ -301,7 +185,8 @@ with col1:
         y='Revenue',
         color='business_unit',
         title="Monthly Revenue by Business Unit",
-        markers=True
+        markers=True,
+        render_mode="webgl"
     )
     fig_line.update_layout(
     height=600,
@@ -311,7 +196,7 @@ with col1:
 
 with col2:
     st.subheader(" Revenue Distribution")
-    revenue_by_bu = filtered_df[filtered_df['Account'] == 'Sales'].groupby('business_unit')[all_months].sum().sum(axis=1).reset_index()
+    revenue_by_bu = filtered_df[filtered_df['Account'] == 'Sales'].groupby('business_unit', observed=True)['_row_total'].sum().reset_index()
     revenue_by_bu.columns = ['business_unit', 'total_revenue']
     
     fig_pie = px.pie(
@@ -383,7 +268,7 @@ with col2:
     st.subheader("Expense Breakdown")
     # Get all expense accounts
     expense_df = filtered_df[~filtered_df['Account'].isin(['Sales', 'Cost of Goods Sold'])]
-    expense_totals = expense_df.groupby('Account')[all_months].sum().sum(axis=1).reset_index()
+    expense_totals = expense_df.groupby('Account', observed=True)['_row_total'].sum().reset_index()
     expense_totals.columns = ['Account', 'Total']
     expense_totals['Total'] = expense_totals['Total'].abs()
     
@@ -402,19 +287,7 @@ st.markdown("---")
 st.header("Business Unit Comparison")
 
 # Create comparison metrics
-bu_comparison_data = []
-for bu in filtered_df['business_unit'].unique():
-    bu_data = filtered_df[filtered_df['business_unit'] == bu]
-    bu_kpis = calculate_kpis(bu_data)
-    bu_comparison_data.append({
-        'Business Unit': bu,
-        'Revenue': bu_kpis['total_sales'],
-        'Expenses': bu_kpis['total_expenses'],
-        'Net Profit': bu_kpis['net_profit'],
-        'Net Margin (%)': bu_kpis['net_margin']
-    })
-
-comparison_df = pd.DataFrame(bu_comparison_data)
+comparison_df = query_bu_comparison(con, selected_business_unit, selected_year)
 
 col1, col2 = st.columns(2)
 
@@ -473,22 +346,17 @@ st.subheader(" Monthly Expense Trends")
 expense_accounts = ['Payroll Expense', 'Marketing Expense', 'R&D Expense', 'Consulting Expense']
 available_expense_accounts = [acc for acc in expense_accounts if acc in filtered_expense_df['Account'].values]
 
-expense_monthly_data = []
-for account in available_expense_accounts:
-    account_data = filtered_expense_df[filtered_expense_df['Account'] == account]
-    for year in selected_years_expense:
-        year_data = account_data[account_data['Year'] == year]
-        for month in all_months:
-            total_expense = year_data[month].abs().sum()
-            expense_monthly_data.append({
-                'Year': year,
-                'Month': month,
-                'Account': account,
-                'Expense': total_expense
-            })
-
-expense_monthly_df = pd.DataFrame(expense_monthly_data)
-expense_monthly_df['Month'] = pd.Categorical(expense_monthly_df['Month'], categories=all_months, ordered=True)
+expense_melted = filtered_expense_df[filtered_expense_df['Account'].isin(available_expense_accounts)].melt(
+    id_vars=['Account', 'Year'],
+    value_vars=all_months,
+    var_name='Month',
+    value_name='Expense'
+)
+expense_melted['Expense'] = expense_melted['Expense'].abs()
+# Ordered months (and accounts) before grouping, so the groups come back in chart order: Jan..Dec per account
+expense_melted['Month'] = pd.Categorical(expense_melted['Month'], categories=all_months, ordered=True)
+expense_melted['Account'] = pd.Categorical(expense_melted['Account'], categories=available_expense_accounts, ordered=True)
+expense_monthly_df = expense_melted.groupby(['Account', 'Year', 'Month'], as_index=False, observed=True)['Expense'].sum()
 
 if not expense_monthly_df.empty:
     fig_expense_trend = px.line(
@@ -499,18 +367,21 @@ if not expense_monthly_df.empty:
         line_group='Year',
         title="Monthly Expense Trends",
         markers=True,
-        facet_col="Year" if len(selected_years_expense) > 1 else None
+        facet_col="Year" if len(selected_years_expense) > 1 else None,
+        render_mode="webgl"
     )
     fig_expense_trend.update_layout(height=400)
     st.plotly_chart(fig_expense_trend, use_container_width=True)
 
 
 st.subheader("📊 Expense Ratios")
-total_revenue = calculate_total_for_account(filtered_expense_df, 'Sales')
+# One reduction over the selected years, the loop below only looks accounts up
+expense_account_totals = account_totals(filtered_expense_df)
+total_revenue = expense_account_totals.get('Sales', 0)
 expense_ratios = []
 
 for account in available_expense_accounts:
-    account_total = abs(calculate_total_for_account(filtered_expense_df, account))
+    account_total = abs(expense_account_totals.get(account, 0))
     ratio = round((account_total / total_revenue * 100),2) if total_revenue != 0 else 0
     expense_ratios.append({
         'Account': account,